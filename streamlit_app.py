@@ -1,16 +1,17 @@
 import streamlit as st
 import requests
-import pandas as pd
-import plotly.graph_objects as go
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # ============================================================
 # CONFIGURATION
 # ============================================================
 
-API_URL = 'https://rakhi5604.pythonanywhere.com'
-
+# Must be the first Streamlit command, ahead of any cached resource below
 st.set_page_config(
     page_title="Microgrid ML Monitor",
     page_icon="⚡",
@@ -18,11 +19,38 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+API_URL = 'https://rakhi5604.pythonanywhere.com'
+DEFAULT_REFRESH_INTERVAL = 10
+
+# Expected, transient API failures (including RetryError once the adapter's
+# retries run out): handled quietly, the status panels report them
+NETWORK_ERRORS = (requests.RequestException,)
+
+@st.cache_resource
+def get_http_session():
+    """Shared HTTP session so every API call reuses pooled keep-alive connections"""
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=2,
+                backoff_factor=0.2,
+                status_forcelist=(502, 503, 504)
+            )
+        )
+    )
+    return session
+
+_SESSION = get_http_session()
+
 # ============================================================
 # CUSTOM CSS
 # ============================================================
 
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .big-font {
         font-size:30px !important;
@@ -53,65 +81,111 @@ st.markdown("""
         border-left: 5px solid #dc3545;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Sits outside live_panel, so fragment ticks never resend it; it must still be
+# emitted on every full run or Streamlit drops it as a stale element. Recent
+# Streamlit releases send style-only HTML without a layout block, older ones
+# render it as an empty block at the top of the page.
+st.html(CUSTOM_CSS)
 
 # ============================================================
 # FUNCTIONS TO FETCH DATA
 # ============================================================
 
-@st.cache_data(ttl=5)
+def run_in_background(fn, *args):
+    """Run fn on a worker thread owned by this script run and return its future"""
+    # A per-run worker (not a server-wide pool) so a slow API can't make one
+    # session's calls queue behind another's
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(fn, *args)
+    executor.shutdown(wait=False)
+    return future
+
+# Shorter than the slider's 5 s minimum, so the next refresh tick never gets a
+# cached reading from the previous one
+@st.cache_data(ttl=4, show_spinner=False)
 def fetch_sensor_data():
-    """Fetch real-time sensor data from API"""
-    try:
-        response = requests.get(f'{API_URL}/api/sensor-data', timeout=5)
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except Exception as e:
-        st.error(f"Error fetching sensor data: {e}")
-        return None
+    """Fetch real-time sensor data from API; failures raise and are not cached"""
+    response = _SESSION.get(f'{API_URL}/api/sensor-data', timeout=5)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def sensor_tick():
+    """Return this refresh tick's sensor data, fetching it at most once per tick"""
+    refresh_interval = st.session_state.get('refresh_interval', DEFAULT_REFRESH_INTERVAL)
+    now = time.monotonic()
+    if now - st.session_state.get('_last_fetch_t', float('-inf')) > refresh_interval - 0.5:
+        try:
+            data = fetch_sensor_data()
+        except NETWORK_ERRORS:
+            data = None
+        except Exception as e:
+            st.error(f"Error fetching sensor data: {e}")
+            data = None
+        st.session_state['_sensor_data'] = data
+        st.session_state['_last_fetch_t'] = now
+    return st.session_state['_sensor_data']
 
-@st.cache_data(ttl=5)
+# Runs on a background thread, so it must not call st.* (no spinner either)
+@st.cache_data(ttl=5, show_spinner=False)
 def fetch_model_info():
     """Check if ML model is loaded"""
     try:
-        response = requests.get(f'{API_URL}/api/model-info', timeout=5)
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except:
+        response = _SESSION.get(f'{API_URL}/api/model-info', timeout=5)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    except (*NETWORK_ERRORS, orjson.JSONDecodeError):
         return None
 
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_prediction(month, day, day_of_week, day_of_year, irradiance, temperature):
+    """Request an ML prediction; cached per feature vector, failures raise and are not cached"""
+    payload = {
+        'Month': month,
+        'Day': day,
+        'DayOfWeek': day_of_week,
+        'DayOfYear': day_of_year,
+        'Irradiance_W_m2': irradiance,
+        'Temperature_C': temperature
+    }
+    
+    response = _SESSION.post(
+        f'{API_URL}/api/predict',
+        json=payload,
+        timeout=5
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
 def make_prediction(sensor_data):
-    """Make ML prediction based on current sensor data"""
+    """Make ML prediction based on current sensor data; runs in the background, unexpected errors raise"""
     try:
-        # Prepare payload for prediction
-        payload = {
-            'Month': datetime.now().month,
-            'Day': datetime.now().day,
-            'DayOfWeek': datetime.now().weekday(),
-            'DayOfYear': datetime.now().timetuple().tm_yday,
-            'Irradiance_W_m2': 800,  # You can update this with real sensor
-            'Temperature_C': 25       # You can update this with real sensor
-        }
+        irradiance = 800  # You can update this with real sensor
+        temperature = 25  # You can update this with real sensor
         
-        response = requests.post(
-            f'{API_URL}/api/predict',
-            json=payload,
-            timeout=5
-        )
+        # Take one timestamp so the date features can't straddle midnight
+        now = datetime.now()
         
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except Exception as e:
-        st.error(f"Error making prediction: {e}")
+        # Quantize the sensor inputs so jitter doesn't defeat the prediction cache
+        return fetch_prediction(
+            now.month,
+            now.day,
+            now.weekday(),
+            now.timetuple().tm_yday,
+            round(irradiance / 10) * 10,
+            round(temperature)
+        )
+    except NETWORK_ERRORS:
         return None
 
 # ============================================================
 # MAIN DASHBOARD
 # ============================================================
 
+# Request model info in the background while the sensor data is fetched below
+model_future = run_in_background(fetch_model_info)
+
 # Title and Header
 st.title("⚡ Microgrid AI/ML Monitoring Dashboard")
 st.markdown("Real-time monitoring with machine learning predictions")
@@ -121,221 +195,218 @@ with st.sidebar:
     st.header("⚙️ Settings")
     
     # Refresh interval
-    refresh_interval = st.slider("Auto-refresh (seconds)", 5, 60, 10)
+    refresh_interval = st.slider(
+        "Auto-refresh (seconds)", 5, 60, DEFAULT_REFRESH_INTERVAL, key='refresh_interval'
+    )
     
     st.markdown("---")
     
-    # Model status
-    model_info = fetch_model_info()
-    if model_info and model_info.get('model_loaded'):
-        st.success("🤖 ML Model: Active")
-        st.info(f"Model Type: {model_info.get('model_type', 'Unknown')}")
-    else:
-        st.warning("🤖 ML Model: Not Loaded")
+    # Model status (filled in once the background request is done)
+    model_status = st.container()
     
     st.markdown("---")
     
     # System status
     st.subheader("🔌 System Status")
-    sensor_data = fetch_sensor_data()
+    sensor_data = sensor_tick()
     if sensor_data:
         st.success("✓ API Connected")
     else:
         st.error("✗ API Disconnected")
+    
+    with model_status:
+        model_info = model_future.result()
+        if model_info and model_info.get('model_loaded'):
+            st.success("🤖 ML Model: Active")
+            st.info(f"Model Type: {model_info.get('model_type', 'Unknown')}")
+        else:
+            st.warning("🤖 ML Model: Not Loaded")
 
 # ============================================================
 # MAIN CONTENT
 # ============================================================
 
-# Fetch data
-data = fetch_sensor_data()
+@st.fragment(run_every=f"{refresh_interval}s")
+def live_panel():
+    """Render the live dashboard rows; re-runs on its own every refresh tick"""
+    # Fetch data (shared with the sidebar within the same tick)
+    data = sensor_tick()
 
-if data:
-    timestamp = data.get('timestamp', datetime.now().isoformat())
-    st.caption(f"Last updated: {timestamp}")
-    
-    # ========== ROW 1: KEY METRICS ==========
-    st.subheader("📊 Real-Time Metrics")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        solar_power = data['solar']['power']
-        st.metric(
-            label="☀️ Solar Power",
-            value=f"{solar_power:.2f} kW",
-            delta=f"{data['solar']['efficiency']}% efficiency"
-        )
-    
-    with col2:
-        battery_level = data['battery']['level']
-        st.metric(
-            label="🔋 Battery Level",
-            value=f"{battery_level}%",
-            delta=f"{data['battery']['health']}% health"
-        )
-    
-    with col3:
-        grid_voltage = data['grid']['voltage']
-        st.metric(
-            label="⚡ Grid Voltage",
-            value=f"{grid_voltage} V",
-            delta=f"PF: {data['grid']['power_factor']}"
-        )
-    
-    with col4:
-        load = data['load']
-        st.metric(
-            label="🏠 Load",
-            value=f"{load:.2f} kW",
-            delta="Active"
-        )
-    
-    st.markdown("---")
-    
-    # ========== ROW 2: DETAILED DATA ==========
-    st.subheader("🔍 Detailed System Data")
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.markdown("### ☀️ Solar Panel")
-        st.write(f"**Voltage:** {data['solar']['voltage']:.1f} V")
-        st.write(f"**Current:** {data['solar']['current']:.1f} A")
-        st.write(f"**Power:** {data['solar']['power']:.2f} kW")
-        st.write(f"**Temperature:** {data['solar']['temperature']}°C")
+    if data:
+        # Start the prediction now so it overlaps with rendering rows 1-2
+        prediction_future = run_in_background(make_prediction, data)
         
-        # Progress bar for efficiency
-        st.progress(data['solar']['efficiency'] / 100)
-        st.caption(f"Efficiency: {data['solar']['efficiency']}%")
-    
-    with col2:
-        st.markdown("### 🔋 Battery System")
-        st.write(f"**Voltage:** {data['battery']['voltage']:.1f} V")
-        st.write(f"**Current:** {data['battery']['current']:.1f} A")
-        st.write(f"**Power:** {data['battery']['power']:.2f} kW")
-        st.write(f"**Temperature:** {data['battery']['temperature']}°C")
+        timestamp = data.get('timestamp', datetime.now().isoformat())
+        st.caption(f"Last updated: {timestamp}")
         
-        # Progress bar for battery level
-        st.progress(data['battery']['level'] / 100)
-        st.caption(f"Charge: {data['battery']['level']}%")
-    
-    with col3:
-        st.markdown("### ⚡ Grid Connection")
-        st.write(f"**Voltage:** {data['grid']['voltage']} V")
-        st.write(f"**Current:** {data['grid']['current']:.1f} A")
-        st.write(f"**Frequency:** {data['grid']['frequency']} Hz")
-        st.write(f"**Power Factor:** {data['grid']['power_factor']}")
+        # Unpack the reading once for all rows below
+        solar = data['solar']
+        battery = data['battery']
+        grid = data['grid']
+        solar_power = solar['power']
+        battery_power = battery['power']
+        battery_level = battery['level']
+        grid_voltage = grid['voltage']
+        load = data['load']
         
-        # Status indicator
-        if data['grid']['voltage'] > 220 and data['grid']['voltage'] < 240:
-            st.success("✓ Grid Normal")
-        else:
-            st.warning("⚠ Grid Abnormal")
-    
-    st.markdown("---")
-    
-    # ========== ROW 3: ML PREDICTIONS ==========
-    st.subheader("🤖 AI/ML Predictions")
-    
-    prediction = make_prediction(data)
-    
-    if prediction and prediction.get('status') == 'success':
-        col1, col2 = st.columns(2)
+        # ========== ROW 1: KEY METRICS ==========
+        st.subheader("📊 Real-Time Metrics")
+        
+        col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            pred_value = prediction.get('prediction', 0)
             st.metric(
-                label="🔮 Predicted Solar Output (Next Hour)",
-                value=f"{pred_value:.2f} kW",
-                delta="ML Forecast"
+                label="☀️ Solar Power",
+                value=f"{solar_power:.2f} kW",
+                delta=f"{solar['efficiency']}% efficiency"
+            )
+        
+        with col2:
+            st.metric(
+                label="🔋 Battery Level",
+                value=f"{battery_level}%",
+                delta=f"{battery['health']}% health"
+            )
+        
+        with col3:
+            st.metric(
+                label="⚡ Grid Voltage",
+                value=f"{grid_voltage} V",
+                delta=f"PF: {grid['power_factor']}"
+            )
+        
+        with col4:
+            st.metric(
+                label="🏠 Load",
+                value=f"{load:.2f} kW",
+                delta="Active"
             )
+        
+        st.markdown("---")
+        
+        # ========== ROW 2: DETAILED DATA ==========
+        st.subheader("🔍 Detailed System Data")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.markdown("### ☀️ Solar Panel")
+            st.write(f"**Voltage:** {solar['voltage']:.1f} V")
+            st.write(f"**Current:** {solar['current']:.1f} A")
+            st.write(f"**Power:** {solar_power:.2f} kW")
+            st.write(f"**Temperature:** {solar['temperature']}°C")
             
-            # Create a simple gauge chart
-            fig = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=pred_value,
-                title={'text': "Predicted Power (kW)"},
-                gauge={
-                    'axis': {'range': [None, 100]},
-                    'bar': {'color': "darkblue"},
-                    'steps': [
-                        {'range': [0, 30], 'color': "lightgray"},
-                        {'range': [30, 70], 'color': "gray"},
-                        {'range': [70, 100], 'color': "darkgray"}
-                    ],
-                }
-            ))
-            st.plotly_chart(fig, use_container_width=True)
+            # Progress bar for efficiency
+            st.progress(solar['efficiency'] / 100)
+            st.caption(f"Efficiency: {solar['efficiency']}%")
         
         with col2:
-            st.markdown("### 📈 Prediction Details")
-            st.write(f"**Model Type:** RandomForestRegressor")
-            st.write(f"**Features Used:** {len(prediction.get('features_used', []))}")
-            st.write(f"**Prediction Time:** {prediction.get('timestamp', 'N/A')}")
+            st.markdown("### 🔋 Battery System")
+            st.write(f"**Voltage:** {battery['voltage']:.1f} V")
+            st.write(f"**Current:** {battery['current']:.1f} A")
+            st.write(f"**Power:** {battery_power:.2f} kW")
+            st.write(f"**Temperature:** {battery['temperature']}°C")
             
-            st.info("💡 This prediction is based on historical patterns and current conditions.")
-    else:
-        st.warning("⚠️ ML predictions unavailable. Check model status in sidebar.")
-    
-    st.markdown("---")
-    
-    # ========== ROW 4: ENERGY BALANCE ==========
-    st.subheader("⚖️ Energy Balance")
-    
-    col1, col2 = st.columns([2, 1])
-    
-    with col1:
-        # Create energy flow visualization
-        fig = go.Figure()
+            # Progress bar for battery level
+            st.progress(battery_level / 100)
+            st.caption(f"Charge: {battery_level}%")
         
-        fig.add_trace(go.Bar(
-            x=['Solar', 'Battery', 'Grid'],
-            y=[data['solar']['power'], data['battery']['power'], 0],
-            name='Generation',
-            marker_color='green'
-        ))
+        with col3:
+            st.markdown("### ⚡ Grid Connection")
+            st.write(f"**Voltage:** {grid_voltage} V")
+            st.write(f"**Current:** {grid['current']:.1f} A")
+            st.write(f"**Frequency:** {grid['frequency']} Hz")
+            st.write(f"**Power Factor:** {grid['power_factor']}")
+            
+            # Status indicator
+            if 220 < grid_voltage < 240:
+                st.success("✓ Grid Normal")
+            else:
+                st.warning("⚠ Grid Abnormal")
         
-        fig.add_trace(go.Bar(
-            x=['Load'],
-            y=[data['load']],
-            name='Consumption',
-            marker_color='red'
-        ))
+        st.markdown("---")
         
-        fig.update_layout(
-            title="Energy Flow (kW)",
-            xaxis_title="Source/Load",
-            yaxis_title="Power (kW)",
-            barmode='group'
-        )
+        # ========== ROW 3: ML PREDICTIONS ==========
+        st.subheader("🤖 AI/ML Predictions")
         
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.markdown("### 💡 Energy Summary")
+        try:
+            prediction = prediction_future.result()
+        except Exception as e:
+            st.error(f"Error making prediction: {e}")
+            prediction = None
+        
+        if prediction and prediction.get('status') == 'success':
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                pred_value = prediction.get('prediction', 0)
+                st.metric(
+                    label="🔮 Predicted Solar Output (Next Hour)",
+                    value=f"{pred_value:.2f} kW",
+                    delta="ML Forecast",
+                    delta_color="off"
+                )
+                
+                # Progress bar on a 0-100 kW scale in place of a Plotly gauge
+                st.progress(max(0.0, min(pred_value / 100, 1.0)))
+                st.caption(f"Predicted: {pred_value:.2f} kW / 100 kW scale")
+            
+            with col2:
+                st.markdown("### 📈 Prediction Details")
+                st.write(f"**Model Type:** RandomForestRegressor")
+                st.write(f"**Features Used:** {len(prediction.get('features_used', []))}")
+                st.write(f"**Prediction Time:** {prediction.get('timestamp', 'N/A')}")
+                
+                st.info("💡 This prediction is based on historical patterns and current conditions.")
+        else:
+            st.warning("⚠️ ML predictions unavailable. Check model status in sidebar.")
         
-        total_generation = data['solar']['power'] + data['battery']['power']
-        total_consumption = data['load']
-        surplus = total_generation - total_consumption
+        st.markdown("---")
         
-        st.write(f"**Total Generation:** {total_generation:.2f} kW")
-        st.write(f"**Total Consumption:** {total_consumption:.2f} kW")
+        # ========== ROW 4: ENERGY BALANCE ==========
+        st.subheader("⚖️ Energy Balance")
         
-        if surplus > 0:
-            st.success(f"**✓ Surplus:** {surplus:.2f} kW")
-        elif surplus < 0:
-            st.error(f"**✗ Deficit:** {abs(surplus):.2f} kW")
-        else:
-            st.info("**Balance:** 0 kW")
-    
-    # Auto-refresh
-    time.sleep(refresh_interval)
-    st.rerun()
+        col1, col2 = st.columns([2, 1])
+        
+        with col1:
+            # Native (Vega-Lite) bar chart of the energy flow
+            st.markdown("### 🔄 Energy Flow (kW)")
+            st.bar_chart(
+                {
+                    'Source/Load': ['Solar', 'Battery', 'Grid', 'Load'],
+                    'Power (kW)': [solar_power, battery_power, 0, load],
+                    'Flow': ['Generation', 'Generation', 'Generation', 'Consumption']
+                },
+                x='Source/Load',
+                y='Power (kW)',
+                color='Flow'
+            )
+        
+        with col2:
+            st.markdown("### 💡 Energy Summary")
+            
+            total_generation = solar_power + battery_power
+            total_consumption = load
+            surplus = total_generation - total_consumption
+            
+            st.write(f"**Total Generation:** {total_generation:.2f} kW")
+            st.write(f"**Total Consumption:** {total_consumption:.2f} kW")
+            
+            if surplus > 0:
+                st.success(f"**✓ Surplus:** {surplus:.2f} kW")
+            elif surplus < 0:
+                st.error(f"**✗ Deficit:** {abs(surplus):.2f} kW")
+            else:
+                st.info("**Balance:** 0 kW")
+        
+    else:
+        st.error("❌ Unable to fetch data from API. Please check your connection.")
+        st.info(f"API URL: {API_URL}")
+        
+        if st.button("🔄 Retry Connection"):
+            # Force a fresh fetch instead of reusing this tick's failed one
+            st.session_state.pop('_last_fetch_t', None)
+            st.rerun()
 
-else:
-    st.error("❌ Unable to fetch data from API. Please check your connection.")
-    st.info(f"API URL: {API_URL}")
-    
-    if st.button("🔄 Retry Connection"):
-        st.rerun()
+
+live_panel()